@@ -9,27 +9,51 @@ normalize_and_reencode_and_split_videos.py
 
 import os
 import sys
-import random
+import queue
+import hashlib
+import collections
 import shutil
 import subprocess
+import threading
+import json
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from tqdm import tqdm
 import argparse
 
 VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.mpeg', '.mpg'}
 
-def is_video_file(path: Path):
-    return path.suffix.lower() in VIDEO_EXTS
+SKIP_DIRS = {'__pycache__', 'node_modules'}
+
+def scan_dirs(src_root):
+    # like os.walk(src_root) yielding (dirpath, filenames), but never descends into
+    # hidden ('.git', '.cache', ...) or SKIP_DIRS folders
+    stack = [str(src_root)]
+    while stack:
+        d = stack.pop()
+        files = []
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        if not e.name.startswith('.') and e.name not in SKIP_DIRS:
+                            stack.append(e.path)
+                    elif e.is_file():
+                        files.append(e.name)
+        except OSError:
+            continue  # unreadable or vanished folder: skip it like os.walk does
+        yield d, files
 
 def gather_video_files(src_root: Path):
     files_by_class = {}
-    for root, dirs, files in os.walk(src_root):
-        rootp = Path(root)
-        vids = [rootp / f for f in files if is_video_file(rootp / f)]
+    for root, files in scan_dirs(src_root):
+        # check the extension on the plain string; only build a Path for matches
+        vids = [Path(root, f) for f in files if os.path.splitext(f)[1].lower() in VIDEO_EXTS]
         if not vids:
             continue
-        rel = rootp.relative_to(src_root)
-        class_label = str(rel).replace('\\','/')
+        class_label = os.path.relpath(root, src_root).replace('\\','/')
         files_by_class.setdefault(class_label, []).extend(vids)
     return files_by_class
 
@@ -40,26 +64,227 @@ def ffmpeg_available():
     except Exception:
         return False
 
-def reencode_with_ffmpeg(src: Path, dst: Path, fps=30, width=1280, height=720):
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    # -y overwrite, -hide_banner quiet is optional
+def read_tail(stream, limit=65536):
+    # read `stream` to EOF, keeping only the last `limit` bytes
+    chunks = collections.deque()
+    size = 0
+    for chunk in iter(lambda: stream.read(8192), b""):
+        chunks.append(chunk)
+        size += len(chunk)
+        while size - len(chunks[0]) >= limit:
+            size -= len(chunks.popleft())
+    return b"".join(chunks)[-limit:].decode(errors="replace")
+
+def run_ffmpeg(cmd):
+    # on failure raise CalledProcessError with the stderr tail attached
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    tail = read_tail(proc.stderr)
+    proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=tail)
+
+def ffmpeg_executable():
+    # system ffmpeg, else the binary bundled with imageio-ffmpeg (used only as a pipe encoder)
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+def nvenc_available():
+    # builds list h264_nvenc even without a GPU, so do one real 1-frame test encode
+    cmd = [
+        "ffmpeg", "-hide_banner", "-v", "error", "-f", "lavfi", "-i", "nullsrc=s=256x256",
+        "-frames:v", "1", "-c:v", "h264_nvenc", "-f", "null", "-"
+    ]
+    try:
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return res.returncode == 0
+    except Exception:
+        return False
+
+def cuda_filters_available():
+    # pad_cuda only ships with very recent FFmpeg releases
+    try:
+        res = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True)
+        names = {line.split()[1] for line in res.stdout.splitlines() if len(line.split()) > 1}
+        return {"scale_cuda", "pad_cuda"} <= names
+    except Exception:
+        return False
+
+def nvdec_available():
+    # -hwaccels lists cuda for any build compiled with it; actually create the device once
+    cmd = [
+        "ffmpeg", "-hide_banner", "-v", "error", "-init_hw_device", "cuda",
+        "-f", "lavfi", "-i", "nullsrc=s=64x64", "-frames:v", "1", "-f", "null", "-"
+    ]
+    try:
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return res.returncode == 0
+    except Exception:
+        return False
+
+def probe_stream(path: Path):
+    # (width, height, fps, codec_name) of the first video stream, or None if ffprobe fails
     cmd = [
-        "ffmpeg", "-y", "-i", str(src),
-        "-vf", f"scale='min({width},iw)':'min({height},ih)',pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", 
-        "-r", str(fps),
-        "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-        "-c:a", "aac", "-b:a", "128k",
-        str(dst)
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,avg_frame_rate,codec_name", "-of", "json", str(path)
     ]
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        stream = json.loads(res.stdout)["streams"][0]
+        return int(stream["width"]), int(stream["height"]), float(Fraction(stream["avg_frame_rate"])), stream["codec_name"]
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+
+def probe_duration(path: Path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", str(path)]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return float(json.loads(res.stdout)["format"]["duration"])
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+        return None
+
+def part_path(dst: Path):
+    # encoders write to x.part.mp4 and os.replace() it onto dst only after a clean exit, so an
+    # existing dst is always a finished file (and replacing it never touches a shared inode)
+    return dst.with_name(dst.stem + ".part" + dst.suffix)
+
+def finish_part(dst: Path, ok):
+    tmp = part_path(dst)
+    if ok:
+        os.replace(tmp, dst)
+    else:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+
+def already_encoded(src: Path, dst: Path, tolerance=0.5):
+    # resume support: outputs only appear once complete (see part_path), so the duration
+    # probe just guards against a source that changed since the last run
+    if not dst.exists():
+        return False
+    # a --mode link/copy output (same inode, or copy2's identical size+mtime) is the
+    # untouched source, not a finished encode
+    src_st, dst_st = src.stat(), dst.stat()
+    if os.path.samestat(src_st, dst_st) or (src_st.st_size, src_st.st_mtime) == (dst_st.st_size, dst_st.st_mtime):
+        return False
+    src_dur, dst_dur = probe_duration(src), probe_duration(dst)
+    return src_dur is not None and dst_dur is not None and abs(src_dur - dst_dur) <= tolerance
+
+def scale_pad_filter(width, height, fps, cuda=False):
+    # scale + pad + fps in one filter graph; the fps filter already yields a CFR stream.
+    # The GPU chain uses the same clamp-each-side rule so output does not depend on the host.
+    if cuda:
+        return (f"scale_cuda='min({width},iw)':'min({height},ih)',"
+                f"pad_cuda={width}:{height}:(ow-iw)/2:(oh-ih)/2,fps={fps}")
+    return (f"scale='min({width},iw)':'min({height},ih)':flags=fast_bilinear,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,fps={fps}")
+
+def x264_args(preset="veryfast", crf=23, tune="fastdecode", threads=0):
+    args = ["-c:v", "libx264", "-preset", preset, "-crf", str(crf)]
+    if tune:
+        # fastdecode (no CABAC/deblock) makes clips cheaper to decode in the training dataloader
+        args += ["-tune", tune]
+    if threads:
+        # sliced threads with a fixed count: N parallel jobs do not each spawn ~1.5x cores frame threads
+        args += ["-x264-params", f"sliced-threads=1:threads={threads}"]
+    return args
+
+def input_thread_args(threads, filter_complex=False):
+    # the output -threads only caps the encoder; also cap decoder and filter-graph threads
+    # so each job really uses ~threads cores, as the pool size assumes
+    if not threads:
+        return []
+    flag = "-filter_complex_threads" if filter_complex else "-filter_threads"
+    return [flag, str(threads), "-threads", str(threads)]
+
+def reencode_with_ffmpeg(src: Path, dst: Path, fps=30, width=1280, height=720, threads=0,
+                         preset="veryfast", crf=23, tune="fastdecode", audio=True, nvenc=False, stream_copy=True,
+                         hwdec=False):
+    info = probe_stream(src) if stream_copy else None
+    copy = bool(info) and info[:2] == (width, height) and abs(info[2] - fps) < 0.01 and info[3] == "h264"
+    if copy:
+        # already conformant: remux only, no second lossy encode
+        video = ["-i", str(src), "-c", "copy"]
+    elif nvenc:
+        # decode, scale/pad and encode all on the GPU; frames never leave device memory
+        video = [
+            "-hwaccel", "cuda", "-hwaccel_output_format", "cuda", "-i", str(src),
+            "-vf", scale_pad_filter(width, height, fps, cuda=True),
+            # -b:v 0 lifts NVENC's default bitrate cap so -cq actually controls quality
+            "-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", str(crf), "-b:v", "0",
+        ]
+    else:
+        # NVDEC decode only; frames are downloaded to system memory for the CPU scale filter
+        video = ["-hwaccel", "cuda"] if hwdec else []
+        video += [
+            "-i", str(src),
+            "-vf", scale_pad_filter(width, height, fps),
+        ] + x264_args(preset=preset, crf=crf, tune=tune, threads=threads)
+    # -y overwrite, -hide_banner quiet is optional
+    # -nostats keeps progress lines out of the captured stderr tail
+    cmd = ["ffmpeg", "-y", "-nostats"] + input_thread_args(threads) + video
+    # -an skips the AAC encoder entirely when the audio track is not needed
+    if not audio:
+        cmd += ["-an"]
+    elif not copy:
+        cmd += ["-c:a", "aac", "-b:a", "128k"]
+    # moov atom at the front -> faster open/seek when loading clips later
+    cmd += ["-movflags", "+faststart"]
+    if threads:
+        # cap per-process threading so several ffmpeg jobs can share the cores
+        cmd += ["-threads", str(threads)]
+    cmd.append(str(part_path(dst)))
+    try:
+        run_ffmpeg(cmd)
+        finish_part(dst, True)
         return True
     except subprocess.CalledProcessError as e:
-        print(f"[WARN] ffmpeg failed for {src}: {e}")
+        finish_part(dst, False)
+        if (nvenc or hwdec) and not copy:
+            # e.g. NVENC session limit reached, missing CUDA filters or no usable device -> retry on CPU
+            print(f"[WARN] {'NVENC' if nvenc else 'NVDEC'} failed for {src}, falling back to CPU libx264.")
+            return reencode_with_ffmpeg(src, dst, fps=fps, width=width, height=height, threads=threads,
+                                        preset=preset, crf=crf, tune=tune, audio=audio, nvenc=False,
+                                        stream_copy=False, hwdec=False)
+        print(f"[WARN] ffmpeg failed for {src}: {e}\n{e.stderr}")
         return False
 
+def reencode_variants_with_ffmpeg(src: Path, outputs, fps=30, threads=0,
+                                  preset="veryfast", crf=23, tune="fastdecode", audio=True):
+    # outputs: list of (dst, width, height). The source is decoded once and fanned out
+    # with the split filter, so N variants cost one decode pass instead of N.
+    n = len(outputs)
+    graph = [f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n))]
+    for i, (_, width, height) in enumerate(outputs):
+        graph.append(f"[v{i}]{scale_pad_filter(width, height, fps)}[o{i}]")
+    cmd = ["ffmpeg", "-y", "-nostats"] + input_thread_args(threads, filter_complex=True)
+    cmd += ["-i", str(src), "-filter_complex", ";".join(graph)]
+    for i, (dst, _, _) in enumerate(outputs):
+        cmd += ["-map", f"[o{i}]"] + x264_args(preset=preset, crf=crf, tune=tune, threads=threads)
+        cmd += ["-map", "0:a?", "-c:a", "aac", "-b:a", "128k"] if audio else ["-an"]
+        cmd += ["-movflags", "+faststart"]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(str(part_path(dst)))
+    try:
+        run_ffmpeg(cmd)
+        ok = True
+    except subprocess.CalledProcessError as e:
+        print(f"[WARN] ffmpeg failed for {src}: {e}\n{e.stderr}")
+        ok = False
+    for dst, _, _ in outputs:
+        finish_part(dst, ok)
+    return ok
+
 # Optional fallback using OpenCV:
-def reencode_with_opencv(src: Path, dst: Path, fps=30, width=1280, height=720):
+def reencode_with_opencv(src: Path, dst: Path, fps=30, width=1280, height=720, prefetch=4,
+                         threads=0, preset="veryfast", crf=23, tune="fastdecode"):
     try:
         import cv2
     except ImportError:
@@ -69,34 +294,202 @@ def reencode_with_opencv(src: Path, dst: Path, fps=30, width=1280, height=720):
     if not cap.isOpened():
         print("[WARN] Cannot open video with OpenCV:", src)
         return False
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    out = cv2.VideoWriter(str(dst), fourcc, fps, (width, height))
-    import math
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # resize/pad frame to target resolution preserving aspect ratio
-        h, w = frame.shape[:2]
-        scale = min(width/w, height/h)
-        nw, nh = int(w*scale), int(h*scale)
-        frame_resized = cv2.resize(frame, (nw, nh))
-        top = (height - nh)//2
-        left = (width - nw)//2
-        canvas = 255 * np.ones((height, width, 3), dtype=frame.dtype)
-        canvas[top:top+nh, left:left+nw] = frame_resized
-        out.write(canvas)
-    cap.release()
-    out.release()
+    ffmpeg_bin = ffmpeg_executable()
+    if ffmpeg_bin:
+        # pipe raw BGR frames into libx264 (yuv420p) instead of cv2's mp4v writer
+        cmd = [
+            ffmpeg_bin, "-y", "-nostats", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+            "-r", str(fps), "-i", "-",
+        ] + x264_args(preset=preset, crf=crf, tune=tune, threads=threads)
+        cmd += ["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(str(part_path(dst)))
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # drain stderr concurrently (we are busy writing stdin) and keep only its tail
+        stderr_tail = []
+        stderr_thread = threading.Thread(target=lambda: stderr_tail.append(read_tail(proc.stderr)), daemon=True)
+        stderr_thread.start()
+
+        def write_frame(canvas):
+            try:
+                proc.stdin.write(canvas.tobytes())
+            except BrokenPipeError:
+                pass  # ffmpeg exited early; reported via returncode below
+    else:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(str(part_path(dst)), fourcc, fps, (width, height))
+        if not out.isOpened():
+            print("[WARN] Cannot open OpenCV VideoWriter for:", dst)
+            cap.release()
+            return False
+        write_frame = out.write
+    # reader thread -> resize (this thread) -> writer thread, joined by bounded queues
+    # so decode, resize and encode of neighbouring frames overlap. None = end of stream.
+    # Keep prefetch small: each queued 1080p frame is ~6 MB and every pool worker has two queues.
+    read_q = queue.Queue(maxsize=prefetch)
+    write_q = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    write_errors = []
+
+    def reader():
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            read_q.put(frame)
+        read_q.put(None)
+
+    def writer():
+        while True:
+            canvas = write_q.get()
+            if canvas is None:
+                break
+            if write_errors:
+                continue  # keep draining so write_q.put() in the main thread never blocks
+            try:
+                write_frame(canvas)
+            except Exception as e:
+                write_errors.append(e)
+                stop.set()
+
+    # resize + pad on the GPU when this OpenCV build has CUDA; only the padded
+    # target-size frame is downloaded back to host memory
+    use_cuda = hasattr(cv2, "cuda") and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    gpu_frame = cv2.cuda_GpuMat() if use_cuda else None
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            frame = read_q.get()
+            if frame is None or stop.is_set():
+                break
+            # resize/pad frame to target resolution preserving aspect ratio
+            h, w = frame.shape[:2]
+            scale = min(width/w, height/h)
+            nw, nh = int(w*scale), int(h*scale)
+            top = (height - nh)//2
+            left = (width - nw)//2
+            bottom = height - nh - top
+            right = width - nw - left
+            if use_cuda:
+                gpu_frame.upload(frame)
+                gpu_resized = cv2.cuda.resize(gpu_frame, (nw, nh))
+                canvas = cv2.cuda.copyMakeBorder(gpu_resized, top, bottom, left, right,
+                                                 cv2.BORDER_CONSTANT, value=(255, 255, 255)).download()
+            else:
+                frame_resized = cv2.resize(frame, (nw, nh))
+                # pad in one pass instead of allocating + filling a full white canvas per frame
+                canvas = cv2.copyMakeBorder(frame_resized, top, bottom, left, right,
+                                            cv2.BORDER_CONSTANT, value=(255, 255, 255))
+            write_q.put(canvas)
+    finally:
+        # unblock the reader if we bailed out early, then drain the writer
+        stop.set()
+        while threads[0].is_alive():
+            try:
+                read_q.get_nowait()
+            except queue.Empty:
+                threads[0].join(timeout=0.1)
+        write_q.put(None)
+        threads[1].join()
+        cap.release()
+        if ffmpeg_bin:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            proc.wait()
+            stderr_thread.join()
+        else:
+            out.release()
+    if write_errors:
+        print(f"[WARN] Writing frames failed for {src}: {write_errors[0]}")
+        finish_part(dst, False)
+        return False
+    if ffmpeg_bin and proc.returncode != 0:
+        print(f"[WARN] ffmpeg pipe encode failed for {src} (exit {proc.returncode})\n{''.join(stderr_tail)}")
+        finish_part(dst, False)
+        return False
+    finish_part(dst, True)
     return True
 
-def split_list(items, ratios=(0.7,0.2,0.1), seed=42):
-    random.Random(seed).shuffle(items)
-    n = len(items)
-    n1 = int(n * ratios[0])
-    n2 = int(n * (ratios[0] + ratios[1]))
-    return items[:n1], items[n1:n2], items[n2:]
+def reencode_job(job, use_ffmpeg=True, fps=30, width=1280, height=720, ffmpeg_opts=None, resume=False):
+    # module-level so it can be pickled by ProcessPoolExecutor
+    # job = (src, dst, extra) where extra is a list of (dst, w, h) additional resolutions
+    src_path, dst_path, extra = job
+    dsts = [dst_path] + [e[0] for e in extra]
+    if resume and all(already_encoded(src_path, dst) for dst in dsts):
+        return True
+    ffmpeg_opts = dict(ffmpeg_opts or {})
+    if use_ffmpeg and extra:
+        # multi-output path is CPU-only (split filter on system-memory frames)
+        ffmpeg_opts.pop("nvenc", None)
+        ffmpeg_opts.pop("stream_copy", None)
+        ffmpeg_opts.pop("hwdec", None)
+        outputs = [(dst_path, width, height)] + list(extra)
+        ok = reencode_variants_with_ffmpeg(src_path, outputs, fps=fps, **ffmpeg_opts)
+        if not ok:
+            print(f"[WARN] ffmpeg failed for {src_path}.")
+    elif use_ffmpeg:
+        ok = reencode_with_ffmpeg(src_path, dst_path, fps=fps, width=width, height=height, **ffmpeg_opts)
+        if not ok:
+            print(f"[WARN] ffmpeg failed for {src_path}.")
+    else:
+        # the pipe encoder honours the same x264 settings and thread cap as the ffmpeg path
+        x264_opts = {k: ffmpeg_opts[k] for k in ("threads", "preset", "crf", "tune") if k in ffmpeg_opts}
+        ok = True
+        for dst, w, h in [(dst_path, width, height)] + list(extra):
+            if not reencode_with_opencv(src_path, dst, fps=fps, width=w, height=h, **x264_opts):
+                print(f"[WARN] re-encode fallback failed for {src_path} -> {dst}.")
+                ok = False
+    return ok
+
+def copy_file_range(src: Path, dst: Path):
+    # in-kernel copy (reflink on btrfs/XFS) without pulling the data through user space
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+    shutil.copystat(src, dst)
+
+def link_or_copy(src: Path, dst: Path, mode="link"):
+    # place `src` at `dst` without re-encoding: hard link (mode="link") or file copy (mode="copy")
+    try:
+        if dst.exists():
+            dst.unlink()
+        if mode == "link":
+            try:
+                os.link(src, dst)
+                return True
+            except OSError:
+                pass  # cross-device or unsupported fs -> copy instead
+        if hasattr(os, "copy_file_range"):
+            try:
+                copy_file_range(src, dst)
+                return True
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+        return True
+    except OSError as e:
+        print(f"[WARN] {mode} failed for {src}: {e}")
+        return False
+
+def assign_split(key, ratios=(0.7,0.2,0.1), seed=42):
+    # key = "class_label/filename" -> train/val/test via a seeded md5 bucket, so a video's
+    # split does not depend on listing order and needs no per-class shuffle
+    h = int.from_bytes(hashlib.md5(f"{seed}:{key}".encode()).digest()[:4], 'little') / 2**32
+    if h < ratios[0]:
+        return "train"
+    if h < ratios[0] + ratios[1]:
+        return "val"
+    return "test"
 
 def main():
     parser = argparse.ArgumentParser(description="Re-encode videos and split dataset.")
@@ -105,7 +498,27 @@ def main():
     parser.add_argument("--fps", type=int, default=30)
     parser.add_argument("--width", type=int, default=1280, help="target width (default 1280 for 720p)")
     parser.add_argument("--height", type=int, default=720, help="target height (default 720)")
+    parser.add_argument("--mode", choices=["reencode", "link", "copy"], default="reencode",
+                        help="reencode (default), or only split already-processed videos via hard links / file copies")
+    parser.add_argument("--extra_sizes", type=str, nargs="*", default=[], metavar="WxH",
+                        help="Additional resolutions encoded in the same ffmpeg pass, saved under videos_WxH/")
+    parser.add_argument("--encoder", choices=["auto", "libx264", "nvenc"], default="auto",
+                        help="Video encoder; auto uses h264_nvenc when a test encode succeeds. "
+                             "NVENC also needs the scale_cuda/pad_cuda filters (recent FFmpeg only)")
+    parser.add_argument("--hwdec", choices=["auto", "on", "off"], default="auto",
+                        help="Decode with NVDEC (-hwaccel cuda) on the libx264 path; auto = if a CUDA device can be opened")
+    parser.add_argument("--preset", type=str, default="veryfast", help="x264 preset (default veryfast)")
+    parser.add_argument("--crf", type=int, default=23, help="x264 CRF (default 23)")
+    parser.add_argument("--tune", type=str, default="fastdecode",
+                        help="x264 tune (default fastdecode for cheaper dataloader decode; 'none' to disable)")
+    parser.add_argument("--force_reencode", action="store_true",
+                        help="Re-encode even when the source is already H.264 at the target size/fps (default: stream copy)")
+    parser.add_argument("--no_audio", action="store_true", help="Drop the audio track (-an) instead of re-encoding it")
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--jobs", type=int, default=0, help="Parallel re-encode jobs (default: cpu_count // threads_per_job)")
+    parser.add_argument("--threads_per_job", type=int, default=2, help="ffmpeg -threads per job (0 = let ffmpeg decide)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip outputs that already exist with the same duration as the source (needs ffprobe)")
     parser.add_argument("--dry_run", action="store_true", help="Don't actually write files; just print planned operations")
     args = parser.parse_args()
 
@@ -116,35 +529,78 @@ def main():
         print("Source root not found:", src_root)
         sys.exit(1)
 
+    extra_sizes = []
+    try:
+        for size in args.extra_sizes:
+            w, h = size.lower().split("x")
+            extra_sizes.append((int(w), int(h)))
+    except ValueError:
+        print("Invalid --extra_sizes, expected e.g. 224x224:", args.extra_sizes)
+        sys.exit(1)
+
     files_by_class = gather_video_files(src_root)
     total = sum(len(v) for v in files_by_class.values())
     print(f"Found {total} videos across {len(files_by_class)} classes.")
 
-    use_ffmpeg = ffmpeg_available()
-    if use_ffmpeg:
+    use_ffmpeg = use_nvenc = use_hwdec = False
+    if args.mode != "reencode":
+        print(f"Mode '{args.mode}': splitting without re-encoding.")
+    elif ffmpeg_available():
+        use_ffmpeg = True
         print("Using ffmpeg for re-encoding.")
+        use_nvenc = args.encoder == "nvenc" or (args.encoder == "auto" and nvenc_available())
+        if use_nvenc and not cuda_filters_available():
+            print("[WARN] ffmpeg lacks scale_cuda/pad_cuda (needs a recent FFmpeg); using libx264 instead of NVENC.")
+            use_nvenc = False
+        if use_nvenc:
+            print("Using NVENC (h264_nvenc) for video encoding.")
+        else:
+            use_hwdec = args.hwdec == "on" or (args.hwdec == "auto" and nvdec_available())
+            if use_hwdec:
+                print("Using NVDEC (-hwaccel cuda) for decoding.")
     else:
         print("ffmpeg not available. Will try OpenCV fallback (needs opencv-python).")
 
     counts = {"train":0,"val":0,"test":0}
+    jobs = []
     for class_label, vids in files_by_class.items():
-        train_v, val_v, test_v = split_list(list(vids), ratios=(0.7,0.2,0.1), seed=args.seed)
-        mapping = [("train", train_v), ("val", val_v), ("test", test_v)]
-        for split_name, items in mapping:
-            for src_path in items:
-                rel_path = Path(class_label) / src_path.name
-                dst_path = out_root / split_name / "videos" / rel_path
-                counts[split_name] += 1
-                if args.dry_run:
-                    continue
-                if use_ffmpeg:
-                    ok = reencode_with_ffmpeg(src_path, dst_path, fps=args.fps, width=args.width, height=args.height)
-                    if not ok:
-                        print(f"[WARN] ffmpeg failed for {src_path}.")
-                else:
-                    ok = reencode_with_opencv(src_path, dst_path, fps=args.fps, width=args.width, height=args.height)
-                    if not ok:
-                        print(f"[WARN] re-encode fallback failed for {src_path}.")
+        for src_path in vids:
+            rel_path = Path(class_label) / src_path.name
+            split_name = assign_split(rel_path.as_posix(), ratios=(0.7,0.2,0.1), seed=args.seed)
+            dst_path = out_root / split_name / "videos" / rel_path
+            extra = [(out_root / split_name / f"videos_{w}x{h}" / rel_path, w, h) for w, h in extra_sizes]
+            counts[split_name] += 1
+            jobs.append((src_path, dst_path, extra))
+
+    if not args.dry_run:
+        # create each output folder once up front instead of a stat+mkdir per file
+        parents = {dst.parent for _, dst_path, extra in jobs for dst in [dst_path] + [e[0] for e in extra]}
+        for parent in parents:
+            parent.mkdir(parents=True, exist_ok=True)
+
+    if args.mode != "reencode":
+        if extra_sizes:
+            print("[WARN] --extra_sizes is ignored with --mode", args.mode)
+        if not args.dry_run:
+            for src_path, dst_path, _ in tqdm(jobs):
+                link_or_copy(src_path, dst_path, mode=args.mode)
+    elif not args.dry_run and jobs:
+        workers = args.jobs or max(1, (os.cpu_count() or 1) // max(1, args.threads_per_job))
+        print(f"Re-encoding {len(jobs)} videos with {workers} parallel jobs.")
+        ffmpeg_opts = {
+            "threads": args.threads_per_job,
+            "preset": args.preset,
+            "crf": args.crf,
+            "tune": None if args.tune.lower() == "none" else args.tune,
+            "audio": not args.no_audio,
+            "nvenc": use_nvenc,
+            "stream_copy": not args.force_reencode,
+            "hwdec": use_hwdec,
+        }
+        worker = partial(reencode_job, use_ffmpeg=use_ffmpeg, fps=args.fps, width=args.width,
+                         height=args.height, ffmpeg_opts=ffmpeg_opts, resume=args.resume)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(tqdm(ex.map(worker, jobs), total=len(jobs)))
     print("Done. Counts:", counts)
 
 if __name__ == "__main__":